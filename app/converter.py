@@ -1,18 +1,50 @@
 """Utilities for converting HTML content into DOCX documents."""
 from __future__ import annotations
 
+import base64
+import io
+import os
 import re
-import shutil
+import subprocess
+import sys
 import tempfile
+import threading
 import zipfile
 from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
 import xml.etree.ElementTree as ET
 from typing import Iterable, Sequence
 
+import httpx
 import pypandoc
 
-from app.preprocess import prepare_html
+from app.preprocess import MATH_REWRITE_MARKERS, prepare_html
+
+
+@lru_cache(maxsize=16)
+def _cached_prepare_html(payload: bytes, promote_entities: bool) -> bytes:
+    """Memoize preprocessing so re-uploads of the same document skip it.
+
+    bytes payloads hash by content, so identical uploads (retries, the same
+    document converted from both UIs) reuse the preprocessed result. The
+    small maxsize bounds memory: at the 5 MB upload cap the cache holds at
+    most ~80 MB in the worst case, typically far less.
+    """
+
+    return prepare_html(payload, promote_entities=promote_entities)
+
+
+def preprocess_payload(payload: bytes) -> bytes:
+    """Run the full HTML preprocessing pipeline, promotion decision included.
+
+    This is the single entry point callers should use ahead of
+    convert_input_bytes(..., preprocessed=True); it keeps the
+    entity-promotion heuristic and the cache in one place.
+    """
+
+    promote = HtmlToDocxConverter._should_promote_entities(payload)
+    return _cached_prepare_html(payload, promote)
 
 
 class InvalidHtmlError(ValueError):
@@ -36,6 +68,69 @@ class ConversionResult:
     workdir: Path
 
 
+class _PandocClient:
+    """HTTP client for a long-lived ``pandoc server`` process.
+
+    Talking to a persistent server avoids the fork/exec and format-table
+    initialisation cost of spawning a fresh ``pandoc`` subprocess for every
+    conversion.
+    """
+
+    def __init__(self, base_url: str, *, timeout: float = 120.0) -> None:
+        self._client = httpx.Client(base_url=base_url, timeout=timeout)
+
+    def convert(
+        self,
+        payload: str | bytes,
+        *,
+        to_format: str,
+        from_format: str,
+        options: Sequence[str] = (),
+    ) -> bytes:
+        """Convert ``payload`` via the server and return the output as bytes.
+
+        Binary input (e.g. DOCX) is transparently base64-encoded; binary
+        output is decoded from the base64 ``output`` field of the response.
+
+        Raises:
+            httpx.HTTPError: If the server is unreachable or returns an error.
+            ValueError: If an option has no pandoc-server translation.
+        """
+
+        if isinstance(payload, bytes):
+            text = base64.b64encode(payload).decode("ascii")
+        else:
+            text = payload
+
+        body = {
+            "text": text,
+            "from": from_format,
+            "to": to_format,
+        }
+        # pandoc-server has no generic CLI-options field (unknown JSON keys
+        # are silently ignored), so each flag must map to its JSON parameter.
+        for option in options:
+            if option == "--mathjax":
+                body["html-math-method"] = {"method": "mathjax"}
+            elif option.startswith("--mathjax="):
+                body["html-math-method"] = {
+                    "method": "mathjax",
+                    "url": option.partition("=")[2],
+                }
+            else:
+                raise ValueError(f"No pandoc-server equivalent for option: {option}")
+        response = self._client.post("/", json=body, headers={"Accept": "application/json"})
+        response.raise_for_status()
+        data = response.json()
+        output = data["output"]
+        if data.get("base64"):
+            return base64.b64decode(output)
+        return output.encode("utf-8")
+
+    def close(self) -> None:
+        self._client.close()
+
+
 class HtmlToDocxConverter:
     """Perform HTML to DOCX conversions using Pandoc."""
 
@@ -53,16 +148,101 @@ class HtmlToDocxConverter:
         # Enable TeX math detection inside HTML (e.g. \( ... \) or $$ ... $$)
         self._input_format = input_format or "html+tex_math_dollars+tex_math_single_backslash"
         self._pandoc_args: Sequence[str] = pandoc_args or ("--mathjax",)
+        self._server_url: str | None = None
+        # One persistent client per worker thread: conversions from the
+        # FastAPI threadpool and Streamlit sessions each keep their own warm
+        # HTTP connection instead of serializing on a shared one.
+        self._thread_local = threading.local()
+        self._clients: list[_PandocClient] = []
+        self._clients_lock = threading.Lock()
 
         if auto_install_pandoc:
             self._ensure_pandoc_available()
 
-    def convert_input_bytes(self, payload: bytes, original_name: str | None = None) -> ConversionResult:
+    def attach_server(self, base_url: str) -> None:
+        """Route conversions through a running ``pandoc server`` instance."""
+
+        self.detach_server()
+        self._server_url = base_url
+
+    def detach_server(self) -> None:
+        """Stop using the pandoc server and fall back to subprocess calls."""
+
+        self._server_url = None
+        with self._clients_lock:
+            clients, self._clients = self._clients, []
+        for client in clients:
+            client.close()
+
+    def _get_server_client(self) -> _PandocClient | None:
+        url = self._server_url
+        if url is None:
+            return None
+        client = getattr(self._thread_local, "client", None)
+        if client is None or getattr(self._thread_local, "url", None) != url:
+            client = _PandocClient(url)
+            self._thread_local.client = client
+            self._thread_local.url = url
+            with self._clients_lock:
+                self._clients.append(client)
+        return client
+
+    def _server_convert(
+        self,
+        payload: str | bytes,
+        *,
+        to_format: str,
+        from_format: str,
+    ) -> bytes | None:
+        """Convert via the attached server, or return None when unavailable.
+
+        Custom pandoc args without a server translation also return None, so
+        those conversions go through the subprocess path, which accepts any
+        CLI flag.
+        """
+
+        client = self._get_server_client()
+        if client is None:
+            return None
+        try:
+            return client.convert(
+                payload,
+                to_format=to_format,
+                from_format=from_format,
+                options=self._pandoc_args,
+            )
+        except (httpx.HTTPError, ValueError):
+            return None
+
+    def warmup(self) -> None:
+        """Prime pandoc with a throwaway conversion.
+
+        The first conversion pays for reader/writer format-table
+        initialisation (and, via the server, connection setup); doing it once
+        at startup keeps that cost off the first real request. Failures are
+        ignored — the first request then simply pays the cost itself.
+        """
+
+        try:
+            result = self.convert_input_bytes(b"<p>warmup</p>", original_name="warmup.html")
+        except (InvalidHtmlError, PandocNotInstalledError, ConversionFailedError):
+            return
+        self.cleanup([result.workdir])
+
+    def convert_input_bytes(
+        self,
+        payload: bytes,
+        original_name: str | None = None,
+        *,
+        preprocessed: bool = False,
+    ) -> ConversionResult:
         """Convert HTML or DOCX payload into a DOCX file.
 
         Args:
             payload: HTML document as bytes.
             original_name: Optional original filename for naming the output.
+            preprocessed: Set when the caller already ran preprocess_payload
+                on an HTML payload, so it is not run a second time here.
 
         Returns:
             ConversionResult with file paths and display name.
@@ -82,45 +262,82 @@ class HtmlToDocxConverter:
         input_extension = self._detect_extension(original_name)
         input_path = workdir / f"input{input_extension}"
 
+        # ``source`` is what the pandoc server receives (str for text formats,
+        # bytes for binary ones); ``input_path`` is the subprocess fallback.
         if input_extension in {".html", ".htm"}:
-            promote = self._should_promote_entities(payload)
-            processed_payload = prepare_html(payload, promote_entities=promote)
-            input_path.write_bytes(processed_payload)
+            processed_payload = payload if preprocessed else preprocess_payload(payload)
+            # HTML is piped to pandoc as text (server POST or convert_text
+            # stdin), so it never touches the workdir.
+            source: str | bytes = processed_payload.decode("utf-8", errors="ignore")
             src_format = self._input_format
+            input_path = None
+        elif input_extension == ".docx" and not self._docx_needs_normalization(payload):
+            # Nothing in the document can trigger a preprocessing rewrite, so
+            # skip the docx -> html -> docx round-trip entirely.
+            input_path.write_bytes(payload)
+            source = payload
+            src_format = "docx"
         elif input_extension == ".docx":
             input_path.write_bytes(payload)
-            # Convert docx -> html to normalize math, then back to docx
-            html_path = workdir / "intermediate.html"
-            pypandoc.convert_file(
-                str(input_path),
-                "html",
-                outputfile=str(html_path),
-                extra_args=list(self._pandoc_args),
-            )
-            normalized_html = prepare_html(html_path.read_bytes(), promote_entities=True)
-            html_path.write_bytes(normalized_html)
-            input_path = html_path
-            src_format = self._input_format
+            # Round-trip docx -> html to normalize math. The intermediate HTML
+            # stays in memory; when preprocessing leaves it untouched there is
+            # nothing to normalize, so the original DOCX converts directly and
+            # the second pandoc pass is skipped entirely.
+            raw_html = self._server_convert(payload, to_format="html", from_format="docx")
+            if raw_html is None:
+                try:
+                    raw_html = pypandoc.convert_file(
+                        str(input_path),
+                        "html",
+                        extra_args=list(self._pandoc_args),
+                    ).encode("utf-8")
+                except OSError as exc:
+                    raise PandocNotInstalledError(
+                        "Pandoc is required for conversion. Install Pandoc and ensure it is on PATH."
+                    ) from exc
+                except RuntimeError as exc:
+                    raise ConversionFailedError(f"Pandoc failed to convert DOCX: {exc}") from exc
+            normalized_html = _cached_prepare_html(raw_html, True)
+            if normalized_html == raw_html:
+                source = payload
+                src_format = "docx"
+            else:
+                source = normalized_html.decode("utf-8", errors="ignore")
+                src_format = self._input_format
+                input_path = None
         else:
             raise InvalidHtmlError("Unsupported file type. Upload HTML or DOCX.")
 
         output_name = f"{output_stem or 'document'}.docx"
         output_path = workdir / output_name
 
-        try:
-            pypandoc.convert_file(
-                str(input_path),
-                "docx",
-                format=src_format,
-                outputfile=str(output_path),
-                extra_args=list(self._pandoc_args),
-            )
-        except OSError as exc:  # Raised when Pandoc binary is missing
-            raise PandocNotInstalledError(
-                "Pandoc is required for conversion. Install Pandoc and ensure it is on PATH."
-            ) from exc
-        except RuntimeError as exc:
-            raise ConversionFailedError(f"Pandoc failed to convert HTML: {exc}") from exc
+        docx_bytes = self._server_convert(source, to_format="docx", from_format=src_format)
+        if docx_bytes is not None:
+            output_path.write_bytes(docx_bytes)
+        else:
+            try:
+                if input_path is not None:
+                    pypandoc.convert_file(
+                        str(input_path),
+                        "docx",
+                        format=src_format,
+                        outputfile=str(output_path),
+                        extra_args=list(self._pandoc_args),
+                    )
+                else:
+                    pypandoc.convert_text(
+                        source,
+                        "docx",
+                        format=src_format,
+                        outputfile=str(output_path),
+                        extra_args=list(self._pandoc_args),
+                    )
+            except OSError as exc:  # Raised when Pandoc binary is missing
+                raise PandocNotInstalledError(
+                    "Pandoc is required for conversion. Install Pandoc and ensure it is on PATH."
+                ) from exc
+            except RuntimeError as exc:
+                raise ConversionFailedError(f"Pandoc failed to convert HTML: {exc}") from exc
 
         if not output_path.exists():
             raise ConversionFailedError("Pandoc reported success but no DOCX file was created.")
@@ -135,11 +352,19 @@ class HtmlToDocxConverter:
         result = self.convert_input_bytes(payload, original_name=original_name)
 
         try:
-            html_output = pypandoc.convert_file(
-                str(result.output_path),
-                "html",
-                extra_args=list(self._pandoc_args),
+            server_html = self._server_convert(
+                result.output_path.read_bytes(),
+                to_format="html",
+                from_format="docx",
             )
+            if server_html is not None:
+                html_output = server_html.decode("utf-8", errors="ignore")
+            else:
+                html_output = pypandoc.convert_file(
+                    str(result.output_path),
+                    "html",
+                    extra_args=list(self._pandoc_args),
+                )
         except OSError as exc:
             raise PandocNotInstalledError(
                 "Pandoc is required for conversion. Install Pandoc and ensure it is on PATH."
@@ -149,21 +374,55 @@ class HtmlToDocxConverter:
         finally:
             self.cleanup([result.workdir])
 
-        cleaned = prepare_html(html_output.encode("utf-8"), promote_entities=True)
+        cleaned = _cached_prepare_html(html_output.encode("utf-8"), True)
         return cleaned.decode("utf-8")
 
+    _RMTREE_SUBPROCESS_THRESHOLD = 1000
+
     @staticmethod
     def cleanup(paths: Iterable[Path | str]) -> None:
         """Remove temporary files or directories created during conversion."""
 
         for target in paths:
             try:
-                shutil.rmtree(target)  # Handles directories
+                HtmlToDocxConverter._fast_rmtree(Path(target))
             except NotADirectoryError:
                 Path(target).unlink(missing_ok=True)
             except FileNotFoundError:
                 continue
 
+    @staticmethod
+    def _fast_rmtree(path: Path) -> None:
+        """Remove a directory tree without shutil.rmtree's per-entry stat calls.
+
+        Walks with os.scandir, which populates the file type from the
+        directory read itself, so entry.is_dir(follow_symlinks=False) costs no
+        extra syscall. Directories are collected parent-first and removed in
+        reverse. Very large trees on Linux are handed to ``rm -rf``, whose
+        syscall path is cheaper still.
+        """
+
+        if sys.platform.startswith("linux"):
+            with os.scandir(path) as entries:
+                entry_count = sum(1 for _ in entries)
+            if entry_count > HtmlToDocxConverter._RMTREE_SUBPROCESS_THRESHOLD:
+                subprocess.run(["rm", "-rf", str(path)], check=False)
+                return
+
+        stack = [str(path)]
+        directories: list[str] = []
+        while stack:
+            current = stack.pop()
+            directories.append(current)
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    else:
+                        os.unlink(entry.path)
+        for directory in reversed(directories):
+            os.rmdir(directory)
+
     @staticmethod
     def _sanitize_filename(name: str | None) -> str:
         """Return a filesystem-safe filename."""
@@ -212,38 +471,58 @@ class HtmlToDocxConverter:
             return
 
     def _force_heading_colors(self, docx_path: Path, color_hex: str) -> None:
-        with tempfile.TemporaryDirectory(prefix="html2docx_styles_") as tmpdir:
-            tmp_root = Path(tmpdir)
-            with zipfile.ZipFile(docx_path) as docx_zip:
-                docx_zip.extractall(tmp_root)
+        """Rewrite styles.xml inside the DOCX without touching the filesystem.
 
-            styles_path = tmp_root / "word" / "styles.xml"
-            if not styles_path.exists():
-                return
+        The archive used to be extracted to a temporary directory and
+        re-zipped file by file; only one member ever changes, so the rebuild
+        now streams archive entries through memory instead.
+        """
 
-            ET.register_namespace("w", self._WORD_NS)
-            tree = ET.parse(styles_path)
-            root = tree.getroot()
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(docx_path) as docx_zip:
+            if "word/styles.xml" not in docx_zip.namelist():
+                return
 
-            ns = {"w": self._WORD_NS}
+            styles_xml = docx_zip.read("word/styles.xml")
+            if not self._has_target_styles(styles_xml):
+                return
 
-            for style_id in self._STYLE_IDS:
-                style = root.find(f".//w:style[@w:styleId='{style_id}']", ns)
-                if style is None:
-                    continue
+            patched_styles = self._patch_styles_xml(styles_xml, color_hex)
+
+            # Each member keeps its original compress_type, so the rebuilt
+            # archive downloads at the same size pandoc produced; XML parts
+            # compress several-fold under DEFLATE.
+            with zipfile.ZipFile(buffer, "w") as new_docx:
+                for info in docx_zip.infolist():
+                    data = patched_styles if info.filename == "word/styles.xml" else docx_zip.read(info.filename)
+                    new_docx.writestr(info, data)
+
+        docx_path.write_bytes(buffer.getvalue())
+
+    @classmethod
+    def _has_target_styles(cls, styles_xml: bytes) -> bool:
+        """Cheap bytes prescreen deciding whether styles.xml needs patching."""
+
+        return any(
+            f'w:styleId="{style_id}"'.encode() in styles_xml
+            or f"w:styleId='{style_id}'".encode() in styles_xml
+            for style_id in cls._STYLE_IDS
+        )
+
+    def _patch_styles_xml(self, styles_xml: bytes, color_hex: str) -> bytes:
+        ET.register_namespace("w", self._WORD_NS)
+        root = ET.fromstring(styles_xml)
+        ns = {"w": self._WORD_NS}
+
+        # One walk over the style elements instead of a full-tree XPath scan
+        # per style id.
+        style_id_attr = f"{{{self._WORD_NS}}}styleId"
+        wanted = set(self._STYLE_IDS)
+        for style in root.iter(f"{{{self._WORD_NS}}}style"):
+            if style.get(style_id_attr) in wanted:
                 self._update_style_color(style, color_hex, ns)
 
-            tree.write(styles_path, encoding="utf-8", xml_declaration=True)
-
-            tmp_docx = tmp_root / "__styled.docx"
-            with zipfile.ZipFile(tmp_docx, "w", compression=zipfile.ZIP_DEFLATED) as new_docx:
-                for file in tmp_root.rglob("*"):
-                    if file == tmp_docx or file.is_dir():
-                        continue
-                    arcname = file.relative_to(tmp_root).as_posix()
-                    new_docx.write(file, arcname)
-
-            shutil.move(tmp_docx, docx_path)
+        return ET.tostring(root, encoding="utf-8", xml_declaration=True)
 
     def _update_style_color(self, style_element: ET.Element, color_hex: str, ns: dict[str, str]) -> None:
         """Ensure both paragraph and run properties force the requested colour."""
@@ -273,6 +552,23 @@ class HtmlToDocxConverter:
             style_run_props = ET.SubElement(style_element, f"{{{self._WORD_NS}}}rPr")
         _ensure_color(style_run_props)
 
+    @staticmethod
+    def _docx_needs_normalization(payload: bytes) -> bool:
+        """Decide whether a DOCX requires the HTML round-trip that fixes math.
+
+        The round-trip exists to rewrite TeX fragments and escaped markup; if
+        word/document.xml contains none of the markers those rewrites key on,
+        the document converts directly. Unreadable archives err on the side
+        of the full round-trip.
+        """
+
+        try:
+            with zipfile.ZipFile(io.BytesIO(payload)) as docx_zip:
+                document_xml = docx_zip.read("word/document.xml")
+        except (zipfile.BadZipFile, KeyError):
+            return True
+        return any(marker in document_xml for marker in MATH_REWRITE_MARKERS)
+
     @staticmethod
     def _should_promote_entities(payload: bytes) -> bool:
         snippet = payload[:2048].lower()
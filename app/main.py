@@ -1,6 +1,17 @@
 """FastAPI application for HTML to DOCX conversion."""
 from __future__ import annotations
 
+import asyncio
+import os
+import socket
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import AsyncIterator
+
+import pypandoc
 from fastapi import BackgroundTasks, FastAPI, File, HTTPException, UploadFile
 from fastapi.responses import FileResponse
 
@@ -9,15 +20,80 @@ from app.converter import (
     HtmlToDocxConverter,
     InvalidHtmlError,
     PandocNotInstalledError,
+    preprocess_payload,
 )
-from app.preprocess import prepare_html
 
 ALLOWED_CONTENT_TYPES = {"text/html", "application/xhtml+xml", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"}
 MAX_FILE_SIZE_BYTES = 5 * 1024 * 1024  # 5 MB default cap
+UPLOAD_CHUNK_SIZE = 64 * 1024
+PANDOC_SERVER_PORT = int(os.environ.get("PANDOC_SERVER_PORT", "3030"))
 
-app = FastAPI(title="HTML to DOCX Converter", version="0.1.0")
 converter = HtmlToDocxConverter()
 
+# Regex-heavy preprocessing holds the GIL, so it runs in worker processes
+# rather than stalling the event loop (or other requests) in-process.
+_preprocess_pool: ProcessPoolExecutor | None = None
+
+
+def _launch_pandoc_server(port: int) -> subprocess.Popen | None:
+    """Start a long-lived ``pandoc server`` so conversions skip process startup.
+
+    Returns the server process once it accepts connections, or None when the
+    pandoc binary is missing or refuses to start; callers then fall back to
+    per-request subprocess conversion.
+    """
+
+    try:
+        pandoc_path = pypandoc.get_pandoc_path()
+    except OSError:
+        return None
+
+    try:
+        process = subprocess.Popen(
+            [pandoc_path, "server", "--port", str(port)],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+    except OSError:
+        return None
+
+    for _ in range(50):
+        if process.poll() is not None:
+            return None
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.1):
+                return process
+        except OSError:
+            time.sleep(0.1)
+
+    process.terminate()
+    return None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    global _preprocess_pool
+    _preprocess_pool = ProcessPoolExecutor(max_workers=2)
+    process = _launch_pandoc_server(PANDOC_SERVER_PORT)
+    if process is not None:
+        converter.attach_server(f"http://127.0.0.1:{PANDOC_SERVER_PORT}")
+    # Prime pandoc's format tables (and the server connection) off-thread so
+    # the first real request does not pay the cold-start cost.
+    await asyncio.get_running_loop().run_in_executor(None, converter.warmup)
+    yield
+    converter.detach_server()
+    if process is not None:
+        process.terminate()
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    _preprocess_pool.shutdown(wait=False, cancel_futures=True)
+    _preprocess_pool = None
+
+
+app = FastAPI(title="HTML to DOCX Converter", version="0.1.0", lifespan=lifespan)
+
 
 @app.get("/health")
 async def health_check() -> dict[str, str]:
@@ -32,14 +108,36 @@ async def convert_html_document(
     if html_file.content_type not in ALLOWED_CONTENT_TYPES and not html_file.filename.lower().endswith(".docx"):
         raise HTTPException(status_code=415, detail="Unsupported file type. Upload HTML or DOCX.")
 
-    payload = await html_file.read()
-    if len(payload) > MAX_FILE_SIZE_BYTES:
-        raise HTTPException(status_code=413, detail="File too large. Max 5 MB allowed.")
+    # Read in chunks so oversized uploads are rejected as soon as they cross
+    # the cap instead of being buffered in full first.
+    buffer = bytearray()
+    while chunk := await html_file.read(UPLOAD_CHUNK_SIZE):
+        buffer.extend(chunk)
+        if len(buffer) > MAX_FILE_SIZE_BYTES:
+            raise HTTPException(status_code=413, detail="File too large. Max 5 MB allowed.")
+    payload = bytes(buffer)
 
     try:
+        loop = asyncio.get_running_loop()
         is_html = html_file.filename.lower().endswith((".html", ".htm"))
-        processed = prepare_html(payload) if is_html else payload
-        result = converter.convert_input_bytes(processed, original_name=html_file.filename)
+        if is_html and _preprocess_pool is not None:
+            processed = await loop.run_in_executor(_preprocess_pool, preprocess_payload, payload)
+        elif is_html:
+            processed = preprocess_payload(payload)
+        else:
+            processed = payload
+        # The conversion blocks on pandoc (HTTP call or subprocess) for up to
+        # its full timeout, so it runs on the default threadpool to keep the
+        # event loop free for other requests.
+        result = await loop.run_in_executor(
+            None,
+            partial(
+                converter.convert_input_bytes,
+                processed,
+                original_name=html_file.filename,
+                preprocessed=is_html,
+            ),
+        )
     except InvalidHtmlError as exc:
         raise HTTPException(status_code=400, detail=str(exc)) from exc
     except PandocNotInstalledError as exc:
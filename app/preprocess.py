@@ -3,22 +3,29 @@ from __future__ import annotations
 
 import html as html_module
 import re
+from html.parser import HTMLParser
 
 DOCTYPE_PATTERN = re.compile(r"<!DOCTYPE[^>]*>", re.IGNORECASE)
 ENCODED_DOCTYPE_PATTERN = re.compile(r"&lt;!DOCTYPE[^&]*&gt;", re.IGNORECASE)
 STYLE_BLOCK_PATTERN = re.compile(r"<style[^>]*>.*?</style>", re.IGNORECASE | re.DOTALL)
 ENCODED_STYLE_PATTERN = re.compile(r"&lt;style[^&]*&gt;.*?&lt;/style&gt;", re.IGNORECASE | re.DOTALL)
+# The span body uses an unrolled loop — runs of non-"<" broken by "<" only
+# when it does not open the closing tag — instead of a lazy ".*?", which
+# backtracked quadratically on pages with many (or nested) spans.
 MATH_SPAN_PATTERN = re.compile(
-    r"<span[^>]*class=\"[^\"]*math-tex[^\"]*\"[^>]*>(.*?)</span>",
-    flags=re.IGNORECASE | re.DOTALL,
+    r"<span[^>]*class=\"[^\"]*math-tex[^\"]*\"[^>]*>([^<]*(?:<(?!/span>)[^<]*)*)</span>",
+    flags=re.IGNORECASE,
 )
 
-TEXT_NODE_PATTERN = re.compile(r">([^<>]+)<")
-
-LATEX_KEYWORD_PATTERN = re.compile(
-    r"\\(frac|times|sqrt|sum|prod|int|left|right|binom|over|cdot|dots|ldots|sin|cos|tan|log|ln|pi|alpha|beta|gamma|theta)",
-    re.IGNORECASE,
+LATEX_KEYWORDS = frozenset(
+    {
+        "frac", "times", "sqrt", "sum", "prod", "int", "left", "right",
+        "binom", "over", "cdot", "dots", "ldots", "sin", "cos", "tan",
+        "log", "ln", "pi", "alpha", "beta", "gamma", "theta",
+    }
 )
+_LATEX_KEYWORD_MAX_LEN = max(map(len, LATEX_KEYWORDS))
+_LATEX_KEYWORD_LENGTHS = tuple(sorted({len(keyword) for keyword in LATEX_KEYWORDS}))
 
 PROMOTABLE_TAGS = {
     "a",
@@ -101,31 +108,129 @@ PROMOTABLE_TAGS = {
     "ul",
 }
 
-ESCAPED_TAG_PATTERN = re.compile(
-    r"&lt;(?P<full>(?P<prefix>/?)\s*(?P<tag>[A-Za-z][A-Za-z0-9:-]*)(?P<tail>[^<>]*?))&gt;",
-    flags=re.IGNORECASE,
+try:
+    # Optional linear-time engine: escaped-tag promotion scans the whole
+    # document and is the heaviest pattern here, so use a DFA when available.
+    import re2 as _re2
+except ImportError:
+    _re2 = None
+
+# Membership in PROMOTABLE_TAGS is compiled straight into the pattern: the
+# tag group is an alternation over the known tags, so non-promotable markup
+# never matches and never reaches the Python replacement callback. The tail
+# must be empty or start with a non-name character, which keeps e.g.
+# "&lt;bogus&gt;" from matching via the "b" branch; it is lazily optional
+# so the match ends at the first "&gt;" after the tag instead of stretching
+# across intervening entities to a later one.
+_PROMOTABLE_TAG_ALTERNATION = "|".join(sorted(PROMOTABLE_TAGS, key=len, reverse=True))
+_ESCAPED_TAG_REGEX = (
+    r"&lt;(?P<full>(?P<prefix>/?)\s*"
+    rf"(?P<tag>(?:{_PROMOTABLE_TAG_ALTERNATION}))"
+    r"(?P<tail>(?:[^A-Za-z0-9:<>-][^<>]*?)??))&gt;"
 )
 
+ESCAPED_TAG_PATTERN = re.compile(_ESCAPED_TAG_REGEX, flags=re.IGNORECASE)
+if _re2 is not None:
+    try:
+        ESCAPED_TAG_PATTERN = _re2.compile(_ESCAPED_TAG_REGEX, _re2.IGNORECASE)
+    except _re2.error:
+        pass
+
 EMBEDDED_HTML_PATTERN = re.compile(r"&lt;html.*?&lt;/html&gt;", re.IGNORECASE | re.DOTALL)
 
-MSO_SPAN_PATTERN = re.compile(r"</?span[^>]*>", re.IGNORECASE)
 MSO_CLASS_PATTERN = re.compile(r'\sclass="?(?:Mso[^"\s>]*)"?', re.IGNORECASE)
-BLOCK_IN_P_PATTERN = re.compile(
-    r"<p>\s*(<(?:html|head|body|div|section|article|aside|nav|main|figure|figcaption|h[1-6]|ul|ol|li|table|thead|tbody|tfoot|tr|td|th|blockquote|pre)[^>]*>.*?</(?:html|head|body|div|section|article|aside|nav|main|figure|figcaption|h[1-6]|ul|ol|li|table|thead|tbody|tfoot|tr|td|th|blockquote|pre)>)\s*</p>",
-    re.IGNORECASE | re.DOTALL,
-)
+
+# Splits a string into (leading whitespace, core, trailing whitespace) in one
+# pass; always matches.
+WS_PARTITION_PATTERN = re.compile(r"^(\s*)(.*?)(\s*)$", re.DOTALL)
+
+# Hot methods bound once at import so per-call attribute lookups (and, for
+# the replacement helpers below, per-call closure construction) stay off
+# the request path.
+_MATH_SPAN_FINDITER = MATH_SPAN_PATTERN.finditer
+_ESCAPED_TAG_FINDITER = ESCAPED_TAG_PATTERN.finditer
+
+
+def _rewrite_matches(html: str, finditer, replace) -> str:
+    """Apply ``replace`` to every match, assembling output from slices.
+
+    The manual finditer loop mirrors wrap_bare_latex_sequences: untouched
+    stretches are appended as slices and joined once, and the input string
+    is returned as-is when nothing matched or every replacement was an
+    identity.
+    """
+
+    out: list[str] = []
+    pos = 0
+    for match in finditer(html):
+        replacement = replace(match)
+        if replacement == match.group(0):
+            continue
+        out.append(html[pos:match.start()])
+        out.append(replacement)
+        pos = match.end()
+    if not out:
+        return html
+    out.append(html[pos:])
+    return "".join(out)
+
+
+def contains_latex_keyword(text: str) -> bool:
+    """Report whether any LaTeX command keyword follows a backslash.
+
+    Replaces the old 23-branch regex alternation: hop between backslashes
+    with memchr-backed str.find and test the following few characters
+    against LATEX_KEYWORDS, stopping at the first hit. Like the regex, a
+    keyword only needs to prefix the command (``\\fraction`` counts)."""
+
+    pos = text.find("\\")
+    while pos != -1:
+        window = text[pos + 1 : pos + 1 + _LATEX_KEYWORD_MAX_LEN]
+        if not window.islower():
+            # Commands are canonically lowercase; fold only the rare window
+            # that actually contains uppercase (e.g. \\Frac).
+            window = window.lower()
+        for length in _LATEX_KEYWORD_LENGTHS:
+            if window[:length] in LATEX_KEYWORDS:
+                return True
+        pos = text.find("\\", pos + 1)
+    return False
+
+
+def _replace_math_span(match: re.Match[str]) -> str:
+    inner = match[1]
+    # Only strip when an edge is actually whitespace, and test both known
+    # prefixes with one C-level tuple check.
+    if inner and (inner[0].isspace() or inner[-1].isspace()):
+        inner = inner.strip()
+    if inner.startswith(("$", "\\(")):
+        return inner
+    return f"\\({inner}\\)"
+
+
+def _promote_escaped_tag(match: re.Match[str]) -> str:
+    # The pattern only matches promotable tags, so no membership check
+    # is needed here.
+    body_unescaped = html_module.unescape(match.group(0))
+    cleaned = body_unescaped.strip()
+
+    if not cleaned.startswith("<"):
+        return match.group(0)
+
+    if cleaned.endswith(">"):
+        return cleaned
+    return f"{cleaned}>"
 
 
 def normalize_math_spans(html: str) -> str:
     """Replace math span wrappers with Pandoc-friendly TeX delimiters."""
 
-    def _replace(match: re.Match[str]) -> str:
-        inner = match.group(1).strip()
-        if inner.startswith("$") or inner.startswith("\\("):
-            return inner
-        return f"\\({inner}\\)"
+    # Wrappers are emitted lowercase (CKEditor and our own wrapper), so a
+    # plain substring scan skips the regex for documents without math.
+    if "math-tex" not in html:
+        return html
 
-    return MATH_SPAN_PATTERN.sub(_replace, html)
+    return _rewrite_matches(html, _MATH_SPAN_FINDITER, _replace_math_span)
 
 
 def promote_escaped_html(html: str) -> str:
@@ -134,91 +239,257 @@ def promote_escaped_html(html: str) -> str:
     if "&lt;" not in html or "&gt;" not in html:
         return html
 
-    def _promote(match: re.Match[str]) -> str:
-        tag = match.group("tag")
-        if tag.lower() not in PROMOTABLE_TAGS:
-            return match.group(0)
-
-        body_unescaped = html_module.unescape(match.group(0))
-        cleaned = body_unescaped.strip()
-
-        if not cleaned.startswith("<"):
-            return match.group(0)
-
-        if cleaned.endswith(">"):
-            return cleaned
-        return f"{cleaned}>"
-
-    return ESCAPED_TAG_PATTERN.sub(_promote, html)
+    return _rewrite_matches(html, _ESCAPED_TAG_FINDITER, _promote_escaped_tag)
 
 
 def strip_html_boilerplate(html: str) -> str:
-    """Remove DOCTYPE declarations and style blocks from HTML."""
-
-    html = DOCTYPE_PATTERN.sub("", html)
-    html = ENCODED_DOCTYPE_PATTERN.sub("", html)
-    html = STYLE_BLOCK_PATTERN.sub("", html)
-    html = ENCODED_STYLE_PATTERN.sub("", html)
+    """Remove DOCTYPE declarations and style blocks from HTML.
+
+    Each pattern only runs after a substring prescreen; ``in`` over a
+    case-folded copy is far cheaper than an IGNORECASE regex pass over
+    clean documents, and folding keeps mixed-case markup (``<Style>``,
+    ``<!DocType``) from slipping past.
+    """
+
+    lowered = html.lower()
+    if "<!doctype" in lowered:
+        html = DOCTYPE_PATTERN.sub("", html)
+    if "&lt;!doctype" in lowered:
+        html = ENCODED_DOCTYPE_PATTERN.sub("", html)
+    if "<style" in lowered:
+        html = STYLE_BLOCK_PATTERN.sub("", html)
+    if "&lt;style" in lowered:
+        html = ENCODED_STYLE_PATTERN.sub("", html)
     return html
 
 
 def extract_embedded_html(html: str) -> tuple[str, bool]:
+    if "&lt;html" not in html.lower():
+        return html, False
     match = EMBEDDED_HTML_PATTERN.search(html)
     if not match:
         return html, False
     return html_module.unescape(match.group(0)), True
 
 
+BLOCK_LEVEL_TAGS = frozenset(
+    {
+        "html", "head", "body", "div", "section", "article", "aside", "nav",
+        "main", "figure", "figcaption", "h1", "h2", "h3", "h4", "h5", "h6",
+        "ul", "ol", "li", "table", "thead", "tbody", "tfoot", "tr", "td",
+        "th", "blockquote", "pre", "meta", "title", "link",
+    }
+)
+
+
+class _WordExportSimplifier(HTMLParser):
+    """Single-pass rewriter collapsing Word-export wrappers.
+
+    Replaces the old chain of regex substitutions, each of which rescanned
+    and reallocated the whole document. One token walk drops span wrappers,
+    strips ``Mso`` classes and unwraps paragraphs that Word emitted around
+    block-level markup, writing output fragments to a list joined at the end.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=False)
+        self._parts: list[str] = []
+        # Stack of (index into _parts where the <p> was emitted, content seen).
+        self._open_paragraphs: list[list] = []
+
+    def result(self) -> str:
+        return "".join(self._parts)
+
+    def _emit(self, fragment: str, *, is_content: bool = True) -> None:
+        if is_content and self._open_paragraphs:
+            self._open_paragraphs[-1][1] = True
+        self._parts.append(fragment)
+
+    def _close_paragraph(self, *, drop_trailing_whitespace: bool = False) -> None:
+        index, has_content = self._open_paragraphs.pop()
+        if has_content:
+            self._parts.append("</p>")
+        elif drop_trailing_whitespace:
+            del self._parts[index:]
+        else:
+            self._parts[index] = ""
+
+    def _start_tag_text(self) -> str:
+        text = self.get_starttag_text() or ""
+        if "Mso" in text or "mso" in text:
+            text = MSO_CLASS_PATTERN.sub("", text)
+        return text
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        if tag == "span":
+            return
+        if tag == "p":
+            if self._open_paragraphs:
+                self._close_paragraph()
+            self._open_paragraphs.append([len(self._parts), False])
+            self._parts.append(self._start_tag_text())
+            return
+        if tag in BLOCK_LEVEL_TAGS and self._open_paragraphs:
+            self._close_paragraph()
+        self._emit(self._start_tag_text())
+
+    def handle_startendtag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        if tag == "span":
+            return
+        self._emit(self._start_tag_text())
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag == "span":
+            return
+        if tag == "p":
+            if self._open_paragraphs:
+                self._close_paragraph(drop_trailing_whitespace=True)
+            # A stray </p> left over from an unwrapped paragraph is dropped.
+            return
+        if tag in BLOCK_LEVEL_TAGS and self._open_paragraphs:
+            self._close_paragraph()
+        self._emit(f"</{tag}>")
+
+    def handle_data(self, data: str) -> None:
+        self._emit(data, is_content=bool(data.strip()))
+
+    def handle_entityref(self, name: str) -> None:
+        self._emit(f"&{name};")
+
+    def handle_charref(self, name: str) -> None:
+        self._emit(f"&#{name};")
+
+    def handle_comment(self, data: str) -> None:
+        self._emit(f"<!--{data}-->", is_content=False)
+
+    def handle_decl(self, decl: str) -> None:
+        self._emit(f"<!{decl}>", is_content=False)
+
+    def unknown_decl(self, data: str) -> None:
+        # Marked sections — Word's downlevel-revealed conditionals like
+        # <![if !supportLists]>...<![endif]> and CDATA blocks — must survive
+        # the round trip; the inherited handler silently drops them. The
+        # parser strips "]]>" from CDATA-style sections but only "]>" from
+        # conditionals, so the terminator is restored to match.
+        section = data.split("[", 1)[0].split(None, 1)[0].lower() if data.strip() else ""
+        if section in {"cdata", "rcdata", "ignore", "include", "temp"}:
+            self._emit(f"<![{data}]]>", is_content=False)
+        else:
+            self._emit(f"<![{data}]>", is_content=False)
+
+    def handle_pi(self, data: str) -> None:
+        self._emit(f"<?{data}>", is_content=False)
+
+
 def simplify_word_export(html: str) -> str:
     """Collapse Word-export wrappers so embedded HTML becomes valid markup."""
 
     if "Mso" not in html and "mso-" not in html:
         return html
 
-    html = MSO_SPAN_PATTERN.sub("", html)
-    html = MSO_CLASS_PATTERN.sub("", html)
-
-    def _strip_wrappers(value: str) -> str:
-        while True:
-            new_value = BLOCK_IN_P_PATTERN.sub(r"\1", value)
-            if new_value == value:
-                break
-            value = new_value
-        return value
-
-    html = _strip_wrappers(html)
-    html = re.sub(
-        r"(</?(?:html|head|body|div|section|article|aside|nav|main|figure|figcaption|h[1-6]|ul|ol|li|table|thead|tbody|tfoot|tr|td|th|blockquote|pre)[^>]*>)\s*</p>",
-        r"\1",
-        html,
-        flags=re.IGNORECASE,
-    )
-    html = re.sub(
-        r"(</?(?:meta|title|link)[^>]*>)\s*</p>",
-        r"\1",
-        html,
-        flags=re.IGNORECASE,
-    )
-    html = re.sub(r"<p>\s*</p>", "", html)
-    html = re.sub(
-        r"<p>\s*(<(?:meta|title|div|section|article|aside|nav|main|figure|figcaption|h[1-6]|ul|ol|li|table|thead|tbody|tfoot|tr|td|th|blockquote|pre|body|html)[^>]*>)",
-        r"\1",
-        html,
-        flags=re.IGNORECASE,
-    )
-    html = re.sub(r"(</(?:div|section|article|aside|nav|main|figure|figcaption|ul|ol|table|tbody|tfoot|thead|tr|td|th|blockquote|pre|body|html)>)\s*</p>", r"\1", html, flags=re.IGNORECASE)
-    html = html.replace("<p></div>", "</div>")
-    html = html.replace("<p></head>", "</head>")
-    html = html.replace("<p></body>", "</body>")
-    html = html.replace("<p></html>", "</html>")
-    html = html.replace("<p><p", "<p").replace("</p></p>", "</p>")
-    return html
+    simplifier = _WordExportSimplifier()
+    simplifier.feed(html)
+    simplifier.close()
+    return simplifier.result()
+
+
+# Byte-level markers that can trigger a math/markup rewrite; shared with the
+# converter's DOCX prescreen so the two stay in sync.
+MATH_REWRITE_MARKERS = (b"\\", b"math-tex", b"&lt;")
+
+# Byte-level markers mirroring the per-transform prescreens: when none of
+# these appear, no transform in the chain can match and the payload does not
+# even need to be decoded. Checked against a case-folded copy, since the
+# underlying patterns are IGNORECASE.
+_TRANSFORM_MARKERS = (
+    b"&lt;",
+    b"<!doctype",
+    b"<style",
+    b"math-tex",
+    b"\\",
+)
 
+# The markers above minus the LaTeX-related ones; used for the idempotency
+# fast path below.
+_NON_LATEX_MARKERS = _TRANSFORM_MARKERS[:3]
 
-def prepare_html(payload: bytes, *, promote_entities: bool = False) -> bytes:
-    """Apply preprocessing transforms to raw HTML bytes."""
 
-    text = payload.decode("utf-8", errors="ignore")
+def _all_backslashes_delimited(payload: bytes) -> bool:
+    """Report whether every backslash sits inside ``\\(...\\)``/``\\[...\\]``.
+
+    Used to recognize re-uploads of converter output: there, TeX commands
+    only ever appear between delimiters, so a backslash that does not open a
+    delimited region (or an unterminated region) means bare LaTeX that still
+    needs wrapping.
+    """
+
+    pos = payload.find(b"\\")
+    while pos != -1:
+        opener = payload[pos + 1 : pos + 2]
+        if opener == b"(":
+            close = payload.find(b"\\)", pos + 2)
+        elif opener == b"[":
+            close = payload.find(b"\\]", pos + 2)
+        else:
+            return False
+        if close == -1:
+            return False
+        pos = payload.find(b"\\", close + 2)
+    return True
+
+
+def _validated_passthrough(payload: bytes) -> bytes:
+    """Return ``payload`` unchanged once it is known to need no transform.
+
+    ASCII payloads are valid UTF-8 by construction and skip validation
+    entirely; invalid byte sequences are stripped to match the slow path.
+    """
+
+    if payload.isascii():
+        return payload
+    try:
+        payload.decode("utf-8")
+    except UnicodeDecodeError:
+        return payload.decode("utf-8", errors="ignore").encode("utf-8")
+    return payload
+
+
+def prepare_html(payload: bytes, *, promote_entities: bool = False) -> bytes:
+    """Apply preprocessing transforms to raw HTML bytes.
+
+    The transform chain itself works on str (html.unescape and HTMLParser
+    have no bytes API), but the decode/encode round-trip is skipped whenever
+    it would be a no-op: payloads without any transform marker are returned
+    untouched, and so is the original buffer when every transform passed the
+    text through unchanged.
+    """
+
+    # bytes.lower() is a single C pass and much cheaper than the decode the
+    # fast paths avoid; folding keeps mixed-case markers conservative.
+    probe = payload.lower()
+    if not any(marker in probe for marker in _TRANSFORM_MARKERS):
+        return _validated_passthrough(payload)
+
+    # Symmetric already-normalized state: a document whose only marker is
+    # TeX math and whose every backslash already sits inside \\(...\\) /
+    # \\[...\\] delimiters is a re-upload of converter output, so the chain
+    # has nothing left to do. Mixed documents — delimited math plus bare
+    # LaTeX elsewhere — fail the delimiter scan and still get wrapped.
+    if (
+        b"math-tex" not in probe
+        and not any(marker in probe for marker in _NON_LATEX_MARKERS)
+        and _all_backslashes_delimited(payload)
+    ):
+        return _validated_passthrough(payload)
+
+    clean_utf8 = True
+    try:
+        text = payload.decode("utf-8")
+    except UnicodeDecodeError:
+        clean_utf8 = False
+        text = payload.decode("utf-8", errors="ignore")
+
+    original_text = text
     text, embedded_found = extract_embedded_html(text)
     if embedded_found:
         text = simplify_word_export(text)
@@ -228,47 +499,76 @@ def prepare_html(payload: bytes, *, promote_entities: bool = False) -> bytes:
         text = strip_html_boilerplate(text)
     text = wrap_bare_latex_sequences(text)
     text = normalize_math_spans(text)
+
+    if clean_utf8 and text == original_text:
+        return payload
     return text.encode("utf-8")
 
 
 def wrap_bare_latex_sequences(html: str) -> str:
-    """Wrap bare LaTeX-like text nodes in math spans for later normalization."""
+    """Wrap bare LaTeX-like text nodes in Pandoc-friendly TeX delimiters.
+
+    Text nodes are located with plain ``str.find``/``str.rfind`` scans rather
+    than a regex substitution; output slices accumulate in a list and the
+    source string is returned untouched when nothing matches. Wrapping emits
+    ``\\(...\\)`` directly, so wrapped nodes are final and the math-span
+    normalization pass only ever sees wrappers that were in the input.
+    """
 
-    def _wrap_text_node(match: re.Match[str]) -> str:
-        original = match.group(1)
-        replaced = wrap_bare_latex_in_text(original)
-        if replaced == original:
-            return match.group(0)
-        return f">{replaced}<"
+    if "\\" not in html:
+        return html
 
-    return TEXT_NODE_PATTERN.sub(_wrap_text_node, html)
+    parts: list[str] = []
+    emitted = 0
+    pos = 0
+    while True:
+        gt = html.find(">", pos)
+        if gt == -1:
+            break
+        lt = html.find("<", gt + 1)
+        if lt == -1:
+            break
+        text_start = html.rfind(">", gt, lt) + 1
+        text = html[text_start:lt]
+        if text and "\\" in text:
+            replaced = wrap_bare_latex_in_text(text)
+            if replaced != text:
+                parts.append(html[emitted:text_start])
+                parts.append(replaced)
+                emitted = lt
+        pos = lt + 1
+
+    if not parts:
+        return html
+    parts.append(html[emitted:])
+    return "".join(parts)
 
 
 def wrap_bare_latex_in_text(text: str) -> str:
-    stripped = text.strip()
-    if not stripped:
-        return text
-    if "\\(" in stripped or "\\[" in stripped or "$" in stripped or "<latex>" in stripped:
+    # Substring rejections are whitespace-insensitive, so they run on the
+    # raw text; the whitespace partition below only happens for the rare
+    # nodes that survive them.
+    if "\\" not in text:
         return text
-    if "\\" not in stripped:
+    if "\\(" in text or "\\[" in text or "$" in text or "<latex>" in text:
         return text
-    if not LATEX_KEYWORD_PATTERN.search(stripped):
+    if not contains_latex_keyword(text):
         return text
 
-    leading_ws = len(text) - len(text.lstrip())
-    trailing_ws = len(text) - len(text.rstrip())
-
-    core = text[leading_ws: len(text) - trailing_ws] if trailing_ws else text[leading_ws:]
-
-    if ":" in core:
-        prefix, suffix = core.split(":", 1)
-        if "\\" in suffix and not any(token in suffix for token in ("\\(", "\\[", "<span")):
-            suffix_ws = len(suffix) - len(suffix.lstrip())
-            suffix_core = suffix[suffix_ws:]
-            wrapped = f"<span class=\"math-tex\">{suffix_core.strip()}</span>"
-            trailing_part = text[len(text) - trailing_ws:] if trailing_ws else ""
-            return f"{text[:leading_ws]}{prefix}:{suffix[:suffix_ws]}{wrapped}{trailing_part}"
+    leading, core, trailing = WS_PARTITION_PATTERN.match(text).groups()
+    if not core:
+        return text
 
-    wrapped_core = f"<span class=\"math-tex\">{core}</span>"
-    trailing_part = text[len(text) - trailing_ws:] if trailing_ws else ""
-    return f"{text[:leading_ws]}{wrapped_core}{trailing_part}"
+    # A tuple join sizes the result buffer once instead of formatting
+    # through an intermediate per f-string segment. TeX delimiters are
+    # emitted directly — exactly what normalize_math_spans would have made
+    # of a math-tex wrapper one step later — so wrapped nodes need no
+    # second pass.
+    prefix, sep, suffix = core.partition(":")
+    if sep and "\\" in suffix and "<span" not in suffix:
+        suffix_leading, suffix_core, _ = WS_PARTITION_PATTERN.match(suffix).groups()
+        return "".join(
+            (leading, prefix, ":", suffix_leading, "\\(", suffix_core, "\\)", trailing)
+        )
+
+    return "".join((leading, "\\(", core, "\\)", trailing))
@@ -22,7 +22,33 @@ st.write(
     unsafe_allow_html=True,
 )
 
-converter = HtmlToDocxConverter()
+@st.cache_resource
+def get_converter() -> HtmlToDocxConverter:
+    """Build the converter once and share it across sessions and reruns.
+
+    Construction probes (and may download) the Pandoc binary, so it must not
+    re-run on every widget interaction."""
+
+    return HtmlToDocxConverter()
+
+
+converter = get_converter()
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def _convert_upload(raw_content: bytes, name: str) -> tuple[bytes, str]:
+    """Convert an upload and return (docx bytes, download name).
+
+    Cached on the upload content, so re-submitting the same file (refresh,
+    download retry) skips the whole Pandoc pipeline. The workdir is cleaned
+    up eagerly since only the in-memory result is kept.
+    """
+
+    result = converter.convert_input_bytes(raw_content, original_name=name)
+    try:
+        return result.output_path.read_bytes(), result.download_name
+    finally:
+        HtmlToDocxConverter.cleanup([result.workdir])
 
 with st.form("upload-form"):
     uploaded_file = st.file_uploader(
@@ -39,8 +65,10 @@ if submit_btn:
         st.warning("Silakan pilih berkas HTML atau DOCX terlebih dahulu.")
     else:
         try:
-            raw_content = uploaded_file.read()
-            result = converter.convert_input_bytes(raw_content, original_name=uploaded_file.name)
+            # UploadedFile is a BytesIO subclass; getvalue() hands back the
+            # underlying buffer without the copy/seek dance of read().
+            raw_content = uploaded_file.getvalue()
+            docx_bytes, download_name = _convert_upload(raw_content, uploaded_file.name)
         except InvalidHtmlError as exc:
             st.error(f"Berkas tidak valid: {exc}")
         except PandocNotInstalledError as exc:
@@ -48,12 +76,10 @@ if submit_btn:
         except ConversionFailedError as exc:
             st.error(f"Konversi gagal: {exc}")
         else:
-            docx_bytes = result.output_path.read_bytes()
             st.success("Konversi berhasil. Klik tombol di bawah untuk mengunduh DOCX baru.")
             st.download_button(
                 label="Download DOCX",
                 data=io.BytesIO(docx_bytes),
-                file_name=result.download_name,
+                file_name=download_name,
                 mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
             )
-            HtmlToDocxConverter.cleanup([result.workdir])